@@ -1,41 +1,75 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field, field_validator
+from fastapi.responses import Response
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
+from pydantic_core import PydanticSerializationError
 from typing import List, Optional, Dict, Any
 from fast_hotels import HotelData, Guests, get_hotels
 from fast_flights import FlightData, Passengers, get_flights
 import logging
+import os
 import re
-import pandas as pd
+import time
+import numpy as np
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from functools import partial
-# from datetime import date as dt_date
+from functools import lru_cache, partial
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from datetime import date
 
 # Helper functions for parsing price and stops
+# Scrapers repeat the same strings ("$1,234", "1") across results, so string parsing is memoized
+_PRICE_RE = re.compile(r"[\d.]+")
+
+@lru_cache(maxsize=2048)
+def _parse_price_str(price):
+    # Join the digit/dot runs so thousands separators drop out: "$1,234.56" -> ["1", "234.56"]
+    parts = _PRICE_RE.findall(price)
+    if parts:
+        return float("".join(parts))
+    return None
+
 def _parse_price(price):
     if isinstance(price, str):
-        # Remove any non-numeric characters except dot and comma
-        match = re.search(r"[\d,.]+", price)
-        if match:
-            # Remove commas and convert to float
-            return float(match.group(0).replace(",", ""))
-        return None
+        return _parse_price_str(price)
     return price
 
+@lru_cache(maxsize=256)
+def _parse_stops_str(stops):
+    return int(stops)
+
 def _parse_stops(stops):
     try:
         if stops is None:
             return None
         if isinstance(stops, int):
             return stops
+        if isinstance(stops, str):
+            return _parse_stops_str(stops)
         # Try to convert to int if it's a string representation of a number
         return int(stops)
     except (ValueError, TypeError):
         return None
 
+def _parse_iso_date(v, field):
+    # fromisoformat also takes compact and week dates on 3.11+, only allow YYYY-MM-DD
+    try:
+        d = date.fromisoformat(v)
+    except ValueError:
+        d = None
+    if d is None or d.isoformat() != v:
+        raise ValueError(f"{field} must be in YYYY-MM-DD format.")
+    return d
+
 app = FastAPI(title="Travel API", description="Plan your trip with the best flight and hotel options")
 
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+logger.addHandler(_log_handler)
+# fast_hotels logs to the root logger, which can attach a root handler; keep app lines from printing twice
+logger.propagate = False
 
 # Hotel search models
 class HotelSearchRequest(BaseModel):
@@ -50,10 +84,7 @@ class HotelSearchRequest(BaseModel):
     
     @field_validator('checkin_date')
     def checkin_date_not_in_past(cls, v):
-        import datetime
-        checkin = datetime.datetime.strptime(v, "%Y-%m-%d").date()
-        today = datetime.date.today()
-        if checkin < today:
+        if _parse_iso_date(v, "checkin_date") < date.today():
             raise ValueError("checkin_date cannot be in the past.")
         return v
 
@@ -114,13 +145,22 @@ class TripPlanRequest(BaseModel):
 
     @field_validator('depart_date')
     def depart_date_not_in_past(cls, v):
-        import datetime
-        depart = datetime.datetime.strptime(v, "%Y-%m-%d").date()
-        today = datetime.date.today()
-        if depart < today:
+        if _parse_iso_date(v, "depart_date") < date.today():
             raise ValueError("depart_date cannot be in the past.")
         return v
 
+    @field_validator('return_date')
+    def return_date_not_before_depart(cls, v, info: ValidationInfo):
+        # An empty return_date still means a one-way trip
+        if not v:
+            return v
+        ret = _parse_iso_date(v, "return_date")
+        # depart_date is validated first and is missing from info.data if it failed
+        depart = info.data.get('depart_date')
+        if depart and ret < date.fromisoformat(depart):
+            raise ValueError("return_date cannot be before depart_date.")
+        return v
+
 class TripPlanResponse(BaseModel):
     best_outbound_flight: Optional[FlightInfo] = Field(None, description="Best outbound flight option")
     best_return_flight: Optional[FlightInfo] = Field(None, description="Best return flight option (if applicable)")
@@ -130,17 +170,138 @@ class TripPlanResponse(BaseModel):
     breakdown: Dict[str, Any] = Field(..., description="Breakdown of costs and trip details")
     suggestions: Optional[str] = Field(None, description="Suggestions for optimizing the trip or saving money")
 
+# Response models are filled from trusted scraper results, so they skip validation
+def _to_flight_info(f, price=None):
+    return FlightInfo.model_construct(
+        name=f.name,
+        departure=f.departure,
+        arrival=f.arrival,
+        arrival_time_ahead=getattr(f, 'arrival_time_ahead', None),
+        duration=getattr(f, 'duration', None),
+        stops=_parse_stops(getattr(f, 'stops', None)),
+        delay=getattr(f, 'delay', None),
+        price=_parse_price(getattr(f, 'price', None)) if price is None else price,
+        is_best=getattr(f, 'is_best', None)
+    )
+
+def _to_hotel_info(h):
+    return HotelInfo.model_construct(
+        name=h.name,
+        price=getattr(h, 'price', None),
+        rating=getattr(h, 'rating', None),
+        url=getattr(h, 'url', None),
+        amenities=getattr(h, 'amenities', None)
+    )
+
+def _cheapest_flight(flights):
+    # Single pass over the raw results, only the winner is turned into a FlightInfo
+    best_raw, best_price = None, float('inf')
+    for f in flights:
+        p = _parse_price(getattr(f, 'price', None))
+        if p is not None and p < best_price:
+            best_raw, best_price = f, p
+    return (best_raw, best_price) if best_raw is not None else (None, None)
+
 executor = ThreadPoolExecutor()
 
-def _run_blocking(func, *args, **kwargs):
-    return func(*args, **kwargs)
+# Round-trip is searched first, the other trip types only when its fare is not already cheap
+RETURN_TRIP_TYPES = ("round-trip", "one-way", "multi-city")
+RETURN_EARLY_PRICE_USD = float(os.getenv("RETURN_EARLY_PRICE_USD", "200"))
+
+# Response cache, TTLs in seconds
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+FLIGHTS_CACHE_TTL = 300
+HOTELS_CACHE_TTL = 900
+TRIP_CACHE_TTL = FLIGHTS_CACHE_TTL
+# Failed scrapes are counted per search for a short window, repeat failures back off
+NEGATIVE_CACHE_TTL = 30
+NEGATIVE_CACHE_THRESHOLD = 2
+# Scraper errors caused by the request itself: unknown trip/seat (KeyError), bad values (ValueError,
+# TypeError) and fast_flights' RuntimeError for a route with no results. These stay 400s and never
+# count as upstream failures; everything else (non-200 responses, network and browser errors) does.
+_CLIENT_ERRORS = (LookupError, TypeError, ValueError, RuntimeError)
+
+redis_client = aioredis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=1, socket_timeout=1)
+
+async def _cache_get(key):
+    try:
+        return await redis_client.get(key)
+    except RedisError as e:
+        logger.warning("Cache get failed for %s: %s", key, e)
+        return None
+
+async def _cache_set(key, ttl, value):
+    try:
+        await redis_client.setex(key, ttl, value)
+    except RedisError as e:
+        logger.warning("Cache set failed for %s: %s", key, e)
+
+async def _cache_delete(key):
+    try:
+        await redis_client.delete(key)
+    except RedisError as e:
+        logger.warning("Cache delete failed for %s: %s", key, e)
+
+async def _record_failure(key):
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            await pipe.incr(key).expire(key, NEGATIVE_CACHE_TTL).execute()
+    except RedisError as e:
+        logger.warning("Cache failure count failed for %s: %s", key, e)
+
+def _flights_cache_key(date, from_airport, to_airport, trip, seat, adults, children, infants_in_seat, infants_on_lap, fetch_mode):
+    return f"flights:{from_airport.upper()}:{to_airport.upper()}:{date}:{trip}:{seat}:{adults}:{children}:{infants_in_seat}:{infants_on_lap}:{fetch_mode}"
+
+def _hotels_cache_key(location, checkin_date, checkout_date, adults, children, limit, fetch_mode):
+    return f"hotels:{location.strip().lower()}:{checkin_date}:{checkout_date}:{adults}:{children}:{limit}:{fetch_mode}"
+
+def _json_response(body):
+    # Hot endpoints return pre-serialized JSON, response_model is kept for the OpenAPI docs
+    # but FastAPI no longer validates these bodies against it
+    return Response(content=body, media_type="application/json")
+
+def _dump_response(model):
+    # Response models skip validation (model_construct), so the one serialization pass is also the
+    # output check: a scraper value of the wrong type fails instead of reaching the client
+    try:
+        return model.model_dump_json(warnings="error")
+    except PydanticSerializationError as e:
+        logger.error("Malformed scraper data in %s: %s", type(model).__name__, e)
+        raise HTTPException(status_code=502, detail="upstream returned malformed data")
 
 async def run_blocking(func, *args, **kwargs):
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(executor, _run_blocking, func, *args, **kwargs)
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+async def _guarded_scrape(cache_key, func, **kwargs):
+    # The first failure in a window still retries upstream, later ones fail fast until the counter expires
+    neg_key = f"neg:{cache_key}"
+    failures = await _cache_get(neg_key)
+    if failures and int(failures) >= NEGATIVE_CACHE_THRESHOLD:
+        raise HTTPException(status_code=502, detail="recent upstream failure, backing off")
+    try:
+        result = await run_blocking(func, **kwargs)
+    except _CLIENT_ERRORS:
+        raise
+    except Exception:
+        await _record_failure(neg_key)
+        raise
+    if failures:
+        await _cache_delete(neg_key)
+    return result
+
+async def _fetch_flights(flight_data, trip, seat, passengers, fetch_mode, cache_key):
+    return await _guarded_scrape(cache_key, get_flights, flight_data=flight_data, trip=trip, seat=seat, passengers=passengers, fetch_mode=fetch_mode)
+
+async def _fetch_hotels(hotel_data, guests, fetch_mode, debug, limit, cache_key):
+    return await _guarded_scrape(cache_key, get_hotels, hotel_data=hotel_data, guests=guests, fetch_mode=fetch_mode, debug=debug, limit=limit)
 
 @app.post("/hotels/search", response_model=HotelSearchResponse)
-def search_hotels(req: HotelSearchRequest):
+async def search_hotels(req: HotelSearchRequest):
+    cache_key = _hotels_cache_key(req.location, req.checkin_date, req.checkout_date, req.adults, req.children, req.limit, req.fetch_mode)
+    cached = await _cache_get(cache_key)
+    if cached:
+        return _json_response(cached)
     try:
         hotel_data = [HotelData(
             checkin_date=req.checkin_date,
@@ -148,31 +309,40 @@ def search_hotels(req: HotelSearchRequest):
             location=req.location
         )]
         guests = Guests(adults=req.adults, children=req.children)
-        result = get_hotels(
+        result = await _fetch_hotels(
             hotel_data=hotel_data,
             guests=guests,
             fetch_mode=req.fetch_mode,
             debug=req.debug,
-            limit=req.limit
+            limit=req.limit,
+            cache_key=cache_key
         )
-        hotels = [HotelInfo(
-            name=h.name,
-            price=getattr(h, 'price', None),
-            rating=getattr(h, 'rating', None),
-            url=getattr(h, 'url', None),
-            amenities=getattr(h, 'amenities', None)
-        ) for h in result.hotels]
-        return HotelSearchResponse(
+        hotels = [_to_hotel_info(h) for h in result.hotels]
+        response = HotelSearchResponse.model_construct(
             hotels=hotels,
             lowest_price=getattr(result, 'lowest_price', None),
             current_price=getattr(result, 'current_price', None)
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Hotel search error: {e}")
+        logger.error("Hotel search error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
+    body = _dump_response(response)
+    # fast_hotels reports scrape errors and timeouts as an empty result, don't cache those
+    if hotels:
+        await _cache_set(cache_key, HOTELS_CACHE_TTL, body)
+    return _json_response(body)
 
 @app.post("/flights/search", response_model=FlightSearchResponse)
-def search_flights(req: FlightSearchRequest):
+async def search_flights(req: FlightSearchRequest):
+    cache_key = _flights_cache_key(
+        req.date, req.from_airport, req.to_airport, req.trip, req.seat,
+        req.adults, req.children, req.infants_in_seat, req.infants_on_lap, req.fetch_mode
+    )
+    cached = await _cache_get(cache_key)
+    if cached:
+        return _json_response(cached)
     try:
         flight_data = [FlightData(
             date=req.date,
@@ -185,35 +355,112 @@ def search_flights(req: FlightSearchRequest):
             infants_in_seat=req.infants_in_seat,
             infants_on_lap=req.infants_on_lap
         )
-        result = get_flights(
+        result = await _fetch_flights(
             flight_data=flight_data,
             trip=req.trip,
             seat=req.seat,
             passengers=passengers,
-            fetch_mode=req.fetch_mode
+            fetch_mode=req.fetch_mode,
+            cache_key=cache_key
         )
-        flights = [FlightInfo(
-            name=f.name,
-            departure=f.departure,
-            arrival=f.arrival,
-            arrival_time_ahead=getattr(f, 'arrival_time_ahead', None),
-            duration=getattr(f, 'duration', None),
-            stops=_parse_stops(getattr(f, 'stops', None)),
-            delay=getattr(f, 'delay', None),
-            price=_parse_price(getattr(f, 'price', None)),
-            is_best=getattr(f, 'is_best', None)
-        ) for f in result.flights]
-        return FlightSearchResponse(
+        flights = [_to_flight_info(f) for f in result.flights]
+        response = FlightSearchResponse.model_construct(
             flights=flights,
             current_price=getattr(result, 'current_price', None)
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Flight search error: {e}")
+        logger.error("Flight search error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
+    body = _dump_response(response)
+    await _cache_set(cache_key, FLIGHTS_CACHE_TTL, body)
+    return _json_response(body)
+
+async def _best_return_flight(req, return_flight_data, passengers):
+    def search(trip_type):
+        cache_key = _flights_cache_key(req.return_date, req.destination, req.origin, trip_type, "economy", req.adults, req.children, 0, 0, "local")
+        return _fetch_flights(flight_data=return_flight_data, trip=trip_type, seat="economy", passengers=passengers, fetch_mode="local", cache_key=cache_key)
+
+    probe_type, other_types = RETURN_TRIP_TYPES[0], RETURN_TRIP_TYPES[1:]
+    trip_types = [probe_type]
+    return_results = await asyncio.gather(search(probe_type), return_exceptions=True)
+    probe = return_results[0]
+    probe_price = None if isinstance(probe, Exception) else _cheapest_flight(getattr(probe, 'flights', []))[1]
+    if probe_price is not None and probe_price < RETURN_EARLY_PRICE_USD:
+        logger.info("Return flight short-circuit: %s fare %s below %s", probe_type, probe_price, RETURN_EARLY_PRICE_USD)
+    else:
+        # Search the remaining trip types in one concurrent batch
+        logger.info("Return flight full search: %s fare %s not below %s", probe_type, probe_price, RETURN_EARLY_PRICE_USD)
+        trip_types += other_types
+        return_results += await asyncio.gather(*(search(trip_type) for trip_type in other_types), return_exceptions=True)
+
+    best_raw, best_price = None, float('inf')
+    failed = False
+    for trip_type, return_result in zip(trip_types, return_results):
+        if isinstance(return_result, Exception):
+            logger.warning("Return flight search error for trip_type %s in /trip/plan: %s", trip_type, return_result)
+            failed = True
+            continue
+        candidate, price = _cheapest_flight(getattr(return_result, 'flights', []))
+        if candidate is not None and price < best_price:
+            best_raw, best_price = candidate, price
+    best_return_flight = _to_flight_info(best_raw, best_price) if best_raw is not None else None
+    # The flag tells the caller a trip type errored, so the plan must not be cached
+    return best_return_flight, failed
+
+# In-process plan cache: one LRU slot per itinerary and TTL window holding the shared plan task.
+# The budget only drives the suggestion, so it is left out of the key and applied per request.
+PLAN_CACHE_SIZE = 1024
+
+def _plan_trip_key(req: TripPlanRequest):
+    # Normalized itinerary shared by the in-process and Redis plan caches
+    prefs = req.hotel_preferences
+    return (
+        req.origin.upper(),
+        req.destination.upper(),
+        req.depart_date,
+        req.return_date or "",
+        req.adults,
+        req.children,
+        prefs.star_rating if prefs and prefs.star_rating else "",
+        prefs.max_price_per_night if prefs and prefs.max_price_per_night else "",
+        "|".join(sorted(prefs.amenities)) if prefs and prefs.amenities else ""
+    )
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _plan_trip_slot(key, ttl_window):
+    return {}
+
+async def _plan_trip_cached(req: TripPlanRequest):
+    key = _plan_trip_key(req)
+    slot = _plan_trip_slot(key, int(time.monotonic() // TRIP_CACHE_TTL))
+    task = slot.get("task")
+    # Failed plans are not kept, the next request for the itinerary retries
+    if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+        task = slot["task"] = asyncio.ensure_future(_plan_trip(req, key))
+    plan, complete = await asyncio.shield(task)
+    # Degraded plans are served to the requests already waiting on them, then evicted
+    if not complete and slot.get("task") is task:
+        del slot["task"]
+    return plan
 
 @app.post("/trip/plan", response_model=TripPlanResponse)
 async def plan_trip(req: TripPlanRequest):
+    plan = await _plan_trip_cached(req)
+    suggestions = None
+    if req.max_total_budget and plan.total_estimated_cost > req.max_total_budget:
+        suggestions = "Consider adjusting your dates, reducing hotel star rating, or increasing your budget."
+    return _json_response(_dump_response(plan.model_copy(update={"suggestions": suggestions})))
+
+async def _plan_trip(req: TripPlanRequest, key):
+    cache_key = "trip:" + ":".join(str(part) for part in key)
+    cached = await _cache_get(cache_key)
+    if cached:
+        return TripPlanResponse.model_validate_json(cached), True
     try:
+        travelers = req.adults + req.children
+        has_return = bool(req.return_date)
         passengers = Passengers(
             adults=req.adults,
             children=req.children,
@@ -227,104 +474,75 @@ async def plan_trip(req: TripPlanRequest):
         )]
         hotel_data = [HotelData(
             checkin_date=req.depart_date,
-            checkout_date=req.return_date if getattr(req, 'return_date', None) else req.depart_date,
+            checkout_date=req.return_date if has_return else req.depart_date,
             location=req.destination
         )]
         return_flight_data = None
-        trip_types = []
-        if getattr(req, 'return_date', None):
+        if has_return:
             return_flight_data = [FlightData(
                 date=req.return_date,
                 from_airport=req.destination,
                 to_airport=req.origin
             )]
-            trip_types = ["one-way", "round-trip", "multi-city"]
-
-        tasks = [
-            run_blocking(partial(get_flights, flight_data=outbound_flight_data, trip="one-way", seat="economy", passengers=passengers, fetch_mode="local")),
-            run_blocking(partial(get_hotels, hotel_data=hotel_data, guests=Guests(adults=req.adults, children=req.children), fetch_mode="live", debug=False, limit=10))
-        ]
-        if return_flight_data:
-            for trip_type in trip_types:
-                tasks.append(run_blocking(partial(get_flights, flight_data=return_flight_data, trip=trip_type, seat="economy", passengers=passengers, fetch_mode="local")))
 
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        outbound_result = results[0]
-        hotel_result = results[1]
-        return_results = results[2:] if return_flight_data else []
+        # Outbound, hotel and return searches are independent, run them all at once
+        outbound_key = _flights_cache_key(req.depart_date, req.origin, req.destination, "one-way", "economy", req.adults, req.children, 0, 0, "local")
+        hotel_key = _hotels_cache_key(req.destination, hotel_data[0].checkin_date, hotel_data[0].checkout_date, req.adults, req.children, 10, "live")
+        outbound_task = asyncio.create_task(_fetch_flights(flight_data=outbound_flight_data, trip="one-way", seat="economy", passengers=passengers, fetch_mode="local", cache_key=outbound_key))
+        hotel_task = asyncio.create_task(_fetch_hotels(hotel_data=hotel_data, guests=Guests(adults=req.adults, children=req.children), fetch_mode="live", debug=False, limit=10, cache_key=hotel_key))
+        return_tasks = [asyncio.create_task(_best_return_flight(req, return_flight_data, passengers))] if return_flight_data else []
+        outbound_result, hotel_result, *return_results = await asyncio.gather(outbound_task, hotel_task, *return_tasks, return_exceptions=True)
+        if isinstance(outbound_result, Exception):
+            logger.error("Outbound flight search error in /trip/plan: %s", outbound_result)
+            raise HTTPException(status_code=502, detail=f"Outbound flight search failed: {outbound_result}")
+        if isinstance(hotel_result, Exception):
+            logger.error("Hotel search error in /trip/plan: %s", hotel_result)
+            raise HTTPException(status_code=502, detail=f"Hotel search failed: {hotel_result}")
+        best_return_flight, return_failed = None, False
+        if return_results:
+            if isinstance(return_results[0], Exception):
+                logger.warning("Return flight search error in /trip/plan: %s", return_results[0])
+                return_failed = True
+            else:
+                best_return_flight, return_failed = return_results[0]
 
         # Outbound flight
-        outbound_flights = [
-            FlightInfo(
-                name=f.name,
-                departure=f.departure,
-                arrival=f.arrival,
-                arrival_time_ahead=getattr(f, 'arrival_time_ahead', None),
-                duration=getattr(f, 'duration', None),
-                stops=_parse_stops(getattr(f, 'stops', None)),
-                delay=getattr(f, 'delay', None),
-                price=_parse_price(getattr(f, 'price', None)),
-                is_best=getattr(f, 'is_best', None)
-            ) for f in getattr(outbound_result, 'flights', [])
-        ] if not isinstance(outbound_result, Exception) else []
-        best_outbound_flight = min((f for f in outbound_flights if f.price is not None), key=lambda x: x.price, default=None)
-
-        # Return flight (find best among all trip types)
-        best_return_flight = None
-        best_price = float('inf')
-        if return_results:
-            for idx, return_result in enumerate(return_results):
-                if isinstance(return_result, Exception):
-                    logging.warning(f"Return flight search error for trip_type {trip_types[idx]} in /trip/plan: {return_result}")
-                    continue
-                return_flights = [
-                    FlightInfo(
-                        name=f.name,
-                        departure=f.departure,
-                        arrival=f.arrival,
-                        arrival_time_ahead=getattr(f, 'arrival_time_ahead', None),
-                        duration=getattr(f, 'duration', None),
-                        stops=_parse_stops(getattr(f, 'stops', None)),
-                        delay=getattr(f, 'delay', None),
-                        price=_parse_price(getattr(f, 'price', None)),
-                        is_best=getattr(f, 'is_best', None)
-                    ) for f in getattr(return_result, 'flights', [])
-                ]
-                candidate = min((f for f in return_flights if f.price is not None), key=lambda x: x.price, default=None)
-                if candidate and candidate.price is not None and candidate.price < best_price:
-                    best_price = candidate.price
-                    best_return_flight = candidate
+        best_outbound_flight = None
+        best_raw, best_price = _cheapest_flight(getattr(outbound_result, 'flights', []))
+        if best_raw is not None:
+            best_outbound_flight = _to_flight_info(best_raw, best_price)
 
         # Hotels
-        hotels = [
-            HotelInfo(
-                name=h.name,
-                price=getattr(h, 'price', None),
-                rating=getattr(h, 'rating', None),
-                url=getattr(h, 'url', None),
-                amenities=getattr(h, 'amenities', None)
-            ) for h in getattr(hotel_result, 'hotels', [])
-        ] if not isinstance(hotel_result, Exception) else []
-        filtered_hotels = hotels
-        if req.hotel_preferences:
-            if req.hotel_preferences.star_rating:
-                filtered_hotels = [h for h in filtered_hotels if h.rating and h.rating >= req.hotel_preferences.star_rating]
-            if req.hotel_preferences.max_price_per_night:
-                filtered_hotels = [h for h in filtered_hotels if h.price and h.price <= req.hotel_preferences.max_price_per_night]
-            if req.hotel_preferences.amenities:
-                filtered_hotels = [h for h in filtered_hotels if h.amenities and all(a in h.amenities for a in req.hotel_preferences.amenities)]
-        best_hotel = min((h for h in filtered_hotels if h.price is not None), key=lambda x: x.price, default=None)
+        hotels = [_to_hotel_info(h) for h in getattr(hotel_result, 'hotels', [])]
+        # Combine the preference filters into one boolean mask and take the cheapest match
+        best_hotel = None
+        if hotels:
+            n = len(hotels)
+            prices = np.fromiter((np.nan if h.price is None else h.price for h in hotels), float, n)
+            mask = ~np.isnan(prices)
+            prefs = req.hotel_preferences
+            if prefs:
+                if prefs.star_rating:
+                    ratings = np.fromiter((np.nan if h.rating is None else h.rating for h in hotels), float, n)
+                    mask &= ratings >= prefs.star_rating
+                if prefs.max_price_per_night:
+                    mask &= (prices != 0) & (prices <= prefs.max_price_per_night)
+                if prefs.amenities:
+                    required = set(prefs.amenities)
+                    mask &= np.fromiter((required.issubset(h.amenities or ()) for h in hotels), bool, n)
+            if mask.any():
+                best_hotel = hotels[int(np.argmin(np.where(mask, prices, np.inf)))]
 
         # Calculate total cost
         total_flight_cost = 0
         if best_outbound_flight and best_outbound_flight.price:
-            total_flight_cost += best_outbound_flight.price * (req.adults + req.children)
+            total_flight_cost += best_outbound_flight.price * travelers
         if best_return_flight and best_return_flight.price:
-            total_flight_cost += best_return_flight.price * (req.adults + req.children)
-        nights = (pd.to_datetime(req.return_date) - pd.to_datetime(req.depart_date)).days if getattr(req, 'return_date', None) else 1
+            total_flight_cost += best_return_flight.price * travelers
+        nights = (date.fromisoformat(req.return_date) - date.fromisoformat(req.depart_date)).days if has_return else 1
         total_hotel_cost = (best_hotel.price * nights) if best_hotel and best_hotel.price else 0
         total_estimated_cost = total_flight_cost + total_hotel_cost
-        per_person_per_day = total_estimated_cost / ((req.adults + req.children) * nights) if nights > 0 and (req.adults + req.children) > 0 else None
+        per_person_per_day = total_estimated_cost / (travelers * nights) if nights > 0 and travelers > 0 else None
 
         breakdown = {
             "flight": total_flight_cost,
@@ -333,21 +551,24 @@ async def plan_trip(req: TripPlanRequest):
             "adults": req.adults,
             "children": req.children
         }
-        suggestions = None
-        if req.max_total_budget and total_estimated_cost > req.max_total_budget:
-            suggestions = "Consider adjusting your dates, reducing hotel star rating, or increasing your budget."
 
-        return TripPlanResponse(
+        response = TripPlanResponse.model_construct(
             best_outbound_flight=best_outbound_flight,
             best_return_flight=best_return_flight,
             best_hotel=best_hotel,
             total_estimated_cost=total_estimated_cost,
             per_person_per_day=per_person_per_day,
-            breakdown=breakdown,
-            suggestions=suggestions
+            breakdown=breakdown
         )
     except HTTPException as e:
         raise e
     except Exception as e:
-        logging.error(f"Trip plan error: {e}")
-        raise HTTPException(status_code=400, detail=str(e)) 
\ No newline at end of file
+        logger.error("Trip plan error: %s", e)
+        raise HTTPException(status_code=400, detail=str(e))
+    # A failed return search or an empty hotel list (fast_hotels returns that on scrape errors)
+    # is a degraded plan: return it, but leave it out of Redis and the in-process cache
+    complete = not return_failed and bool(hotels)
+    body = _dump_response(response)
+    if complete:
+        await _cache_set(cache_key, TRIP_CACHE_TTL, body)
+    return response, complete 
\ No newline at end of file